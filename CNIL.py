@@ -4,7 +4,7 @@ This script downloads, extracts, and processes XML files from the DILA base URL
 It performs the following steps:
 1. Fetches and parses HTML content from a given URL to extract .tar.gz file names.
 2. Downloads files from the given URL and saves them to a specified target path, displaying a progress bar.
-3. Downloads a tar.gz file from a specified URL and extracts its contents to a given directory.
+3. Downloads tar.gz files from a specified URL and extracts their contents to a given directory.
 4. Parses a CNIL XML file and extracts relevant data.
 5. Writes the results to a JSONL file.
 """
@@ -15,13 +15,18 @@ from urllib.error import URLError
 from contextlib import closing
 from typing import List
 from datetime import datetime
-import xml.etree.ElementTree as ET
-import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from itertools import islice
+from lxml import etree as ET
+import mmap
+import os
 import re
 import tarfile
-import json
+import orjson
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
 # https://tqdm.github.io/
 from tqdm import tqdm
@@ -32,18 +37,23 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def clean_text(text):
-    """Clean text by removing XML/HTML tags and normalizing whitespace"""
+# Shared by the download threads so connections to the DILA host are kept alive
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+# Reused across files; huge_tree lifts libxml2's depth/size limits for long texts
+_XML_PARSER = ET.XMLParser(huge_tree=True)
+
+# Container lookups compiled once instead of re-parsed by find() for every file
+_XP_META_COMMUN = ET.XPath("(.//META_COMMUN)[1]")
+_XP_META_CNIL = ET.XPath("(.//META_CNIL)[1]")
+_XP_CONTENU = ET.XPath("(.//CONTENU)[1]")
+
+def clean_body(text):
+    """Normalize whitespace in text extracted by the XML parser (tags and entities already resolved)"""
     if not text:
         return ""
-    text = re.sub(r'<[^>]+>', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = text.replace('&amp;', '&')
-    text = text.replace('&lt;', '<')
-    text = text.replace('&gt;', '>')
-    text = text.replace('&quot;', '"')
-    text = text.replace('&apos;', "'")
-    return text.strip()
+    return re.sub(r'\s+', ' ', text).strip()
 
 def get_tar_files(url: str) -> tuple[List[str], List[str]]:
     """
@@ -83,57 +93,84 @@ def download_with_progress(
         requests.exceptions.RequestException: If there is an issue with the HTTP request.
     """
 
-    response = requests.get(url, stream=True, timeout=15)
-    response.raise_for_status()
+    with SESSION.get(url, stream=True, timeout=15) as response:
+        response.raise_for_status()
 
-    total_size = int(response.headers.get("content-length", 0))
-    progress = tqdm(total=total_size, unit="iB", unit_scale=True)
+        total_size = int(response.headers.get("content-length", 0))
+        progress = tqdm(total=total_size, unit="iB", unit_scale=True, leave=False)
 
-    try:
-        with open(target_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                progress.update(len(chunk))
-                f.write(chunk)
-    finally:
-        progress.close()
+        try:
+            with open(target_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    progress.update(len(chunk))
+                    f.write(chunk)
+        finally:
+            progress.close()
 
 
-def download_and_extract(
+def download_archive(
     url: str,
     filename: str,
     extract_path: Path,
 ):
     """
-    Downloads a tar.gz file from a specified URL and extracts its contents to a given directory.
+    Downloads a tar.gz file from a specified URL into a given directory, unless it is already there.
     Args:
         url (str): The base URL from which to download the file.
         filename (str): The name of the file to download.
-        extract_path (Path): The directory where the file should be extracted.
+        extract_path (Path): The directory where the file should be saved.
+    Returns:
+        Path: The path of the archive, downloaded now or by an earlier run.
     Raises:
         requests.exceptions.RequestException: If there is an error during the download process.
-        tarfile.TarError: If there is an error during the extraction process.
-        RuntimeError: If an unexpected error occurs during the download or extraction process.
+        RuntimeError: If an unexpected error occurs during the download process.
     """
 
     tar_path = Path(extract_path, filename)
+    if tar_path.exists():
+        return tar_path
     try:
-        if not tar_path.exists():
-            logging.info("Downloading %s...", filename)
-            download_with_progress(f"{url}{filename}", tar_path)
-
-            logging.info("Extracting %s...", filename)
-            with tarfile.open(str(tar_path), mode="r:gz") as tar:
-                tar.extractall(str(extract_path))
+        logging.info("Downloading %s...", filename)
+        # Written under a temporary name and renamed once complete, so an
+        # interrupted download is never mistaken for a downloaded archive
+        part_path = Path(extract_path, filename + ".part")
+        download_with_progress(f"{url}{filename}", part_path)
+        os.replace(part_path, tar_path)
+        return tar_path
     except requests.exceptions.RequestException as e:
         raise requests.exceptions.RequestException(
             f"Download failed for {filename}: {str(e)}"
         ) from e
-    except tarfile.TarError as e:
-        raise tarfile.TarError(f"Tar extraction failed for {filename}: {str(e)}") from e
     except Exception as e:
         raise RuntimeError(f"Unexpected error processing {filename}: {str(e)}") from e
 
 
+def extract_archive(tar_path: Path, extract_path: Path):
+    """
+    Extracts a downloaded tar.gz file into a given directory, unless an earlier run already did.
+    Completed extractions are recorded in a "<archive>.extracted" marker file next to the archive.
+    Args:
+        tar_path (Path): The archive to extract.
+        extract_path (Path): The directory where the file should be extracted.
+    Raises:
+        tarfile.TarError: If there is an error during the extraction process.
+        RuntimeError: If an unexpected error occurs during the extraction process.
+    """
+
+    marker_path = tar_path.with_name(tar_path.name + ".extracted")
+    if marker_path.exists():
+        return
+    try:
+        logging.info("Extracting %s...", tar_path.name)
+        with tarfile.open(str(tar_path), mode="r:gz") as tar:
+            tar.extractall(str(extract_path))
+        marker_path.touch()
+    except tarfile.TarError as e:
+        raise tarfile.TarError(f"Tar extraction failed for {tar_path.name}: {str(e)}") from e
+    except Exception as e:
+        raise RuntimeError(f"Unexpected error processing {tar_path.name}: {str(e)}") from e
+
+
 def parse_cnil_xml_file(xml_path):
     """
     Parses a CNIL XML file and extracts relevant data.
@@ -150,15 +187,19 @@ def parse_cnil_xml_file(xml_path):
     data_extracted = {}
 
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        meta = root.find(".//META_COMMUN")
+        # Parse straight from a read-only mapping of the file (served from the
+        # page cache) rather than letting libxml2 read it in small chunks
+        with open(xml_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buf:
+            root = ET.fromstring(buf, parser=_XML_PARSER)
+
+        meta = next(iter(_XP_META_COMMUN(root)), None)
         if meta is not None:
             for field in ["ID", "ORIGINE", "URL", "NATURE"]:
                 data_extracted[field.lower()] = meta.findtext(field, "")
 
-        meta = root.find(".//META_CNIL")
+        meta = next(iter(_XP_META_CNIL(root)), None)
         for field in [
             "TITREFULL",
             "NUMERO",
@@ -174,10 +215,12 @@ def parse_cnil_xml_file(xml_path):
             data_extracted["contenu"] = ET.tostring(
                 contenu, encoding="unicode", method="text"
             ).strip()"""
-        contenu_element = root.find('.//CONTENU')
+        contenu_element = next(iter(_XP_CONTENU(root)), None)
         if contenu_element is not None:
-            content = ''.join(contenu_element.itertext())
-            data_extracted["contenu"] = clean_text(content)
+            content = ET.tostring(
+                contenu_element, encoding="unicode", method="text", with_tail=False
+            )
+            data_extracted["contenu"] = clean_body(content)
 
         return data_extracted
     except ET.ParseError as e:
@@ -186,6 +229,40 @@ def parse_cnil_xml_file(xml_path):
         raise RuntimeError(f"Error parsing {xml_path}: {e}") from e
 
 
+def parse_cnil_xml_files(xml_paths):
+    """
+    Parses a chunk of CNIL XML files (runs in a worker process).
+    Args:
+        xml_paths (List[Path]): The XML files to parse.
+    Returns:
+        List[dict]: The result of `parse_cnil_xml_file` for each file, in order.
+    """
+
+    return [parse_cnil_xml_file(xml_path) for xml_path in xml_paths]
+
+
+def parse_in_pool(executor, xml_paths, chunksize: int = 64):
+    """
+    Yields `parse_cnil_xml_file` results in input order, parsing chunks across a process pool.
+    Unlike `executor.map`, which consumes its whole input and submits every chunk before
+    yielding anything, this reads xml_paths as it goes and keeps a bounded number of chunks
+    in flight, so parsing starts while the tree is still being walked.
+    Args:
+        executor (ProcessPoolExecutor): The pool to parse on.
+        xml_paths (Iterator[Path]): The XML files to parse.
+        chunksize (int, optional): The number of files per task. Defaults to 64.
+    """
+
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    in_flight = deque()
+    for chunk in iter(lambda: list(islice(xml_paths, chunksize)), []):
+        in_flight.append(executor.submit(parse_cnil_xml_files, chunk))
+        if len(in_flight) >= max_in_flight:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+
 def tar_dila_data(base):
     """
     Downloads, extracts, processes XML files from a specified DILA base, and writes the results to a JSONL file.
@@ -194,11 +271,11 @@ def tar_dila_data(base):
     The function performs the following steps:
     1. Creates the necessary directory structure for storing the extracted data.
     2. Constructs the DILA base URL using the provided base name.
-    3. Downloads and extracts tar files from the DILA base URL, skipping files containing "Freemium".
-    4. Processes the extracted XML files to parse relevant data.
-    5. Writes the parsed data to a JSONL file named "cnil_dataset.jsonl".
+    3. Downloads tar files from the DILA base URL concurrently, skipping files containing "Freemium", and extracts them one at a time in name order.
+    4. Processes the extracted XML files in parallel across a process pool.
+    5. Streams the parsed data to a JSONL file named "cnil_dataset.jsonl".
     Note:
-        - The function assumes the existence of helper functions: `get_tar_files`, `download_and_extract`, and `parse_cnil_xml_file`.
+        - The function assumes the existence of helper functions: `get_tar_files`, `download_archive`, `extract_archive`, and `parse_cnil_xml_file`.
         - The function uses the `tqdm` library for progress indication.
     """
 
@@ -208,24 +285,42 @@ def tar_dila_data(base):
     dila_base_url = f"https://echanges.dila.gouv.fr/OPENDATA/{base}/"
 
     logging.info("Downloading and extracting files...")
-    remote_files = get_tar_files(dila_base_url)
-    for remote_file in tqdm(remote_files):
-        if "Freemium" in remote_file:
-            continue
-        download_and_extract(dila_base_url, remote_file, dila_data_path)
-
-    logging.info("Processing XML files...")
-    results = []
-    xml_files = glob.glob(f"{dila_data_path}/**/*.xml", recursive=True)
-    for xml_file in tqdm(xml_files):
-        data = parse_cnil_xml_file(xml_file)
-        if data:
-            results.append(data)
-
-    logging.info("Writing results to 'cnil_dataset.jsonl'")
-    with open("cnil_dataset.jsonl", "w", encoding="utf-8") as f:
-        for item in results:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    # Sorted so the timestamped archives are extracted oldest first and a
+    # document updated by a later archive ends up with its latest version
+    remote_files = sorted(
+        remote_file
+        for remote_file in get_tar_files(dila_base_url)
+        if "Freemium" not in remote_file
+    )
+    # Downloads run concurrently, but extraction into the shared tree stays in
+    # this thread: concurrent extractall() calls race on creating the same
+    # directories and overwrite shared paths in no particular order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        downloads = [
+            executor.submit(download_archive, dila_base_url, remote_file, dila_data_path)
+            for remote_file in remote_files
+        ]
+        try:
+            for download in tqdm(downloads):
+                extract_archive(download.result(), dila_data_path)
+        finally:
+            # On error, surface it without waiting for the downloads not yet started
+            for download in downloads:
+                download.cancel()
+
+    logging.info("Processing XML files into 'cnil_dataset.jsonl'...")
+    # Lazily walked, and consumed by parse_in_pool as it goes, so parsing can
+    # start before the whole tree is listed
+    xml_files = dila_data_path.rglob("*.xml")
+    # 1 MiB write buffer: records are flushed to disk in large chunks rather
+    # than one write per record
+    with open("cnil_dataset.jsonl", "wb", buffering=1 << 20) as f, ProcessPoolExecutor(
+        max_workers=os.cpu_count()
+    ) as executor:
+        results = parse_in_pool(executor, xml_files)
+        for data in tqdm(results):
+            if data:
+                f.write(orjson.dumps(data) + b"\n")
 
 
 if __name__ == "__main__":
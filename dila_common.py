@@ -0,0 +1,552 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import tarfile
+from lxml import etree as ET
+import orjson
+import csv
+import os
+import sys
+from tqdm import tqdm
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from functools import lru_cache
+import queue
+import threading
+import gzip
+import tempfile
+from contextlib import ExitStack, closing
+
+# Shared download/parse/write pipeline for the DILA judicial datasets (CAPP,
+# CASS, INCA, JADE). A dataset is described by a schema mapping each container
+# element parse_xml reads to either:
+#   - a tuple of (path, field) pairs, for metadata containers. A plain tag
+#     names a direct child of the container; anything with a '/' is an
+#     XPath evaluated on the container (attributes, or nested elements whose
+#     own text is used)
+#   - a field name, for body containers whose whole text becomes that field
+#   - None, for an element past which nothing is needed: parsing stops there
+# Fields are written in the order they appear in the schema.
+
+CAPP_SCHEMA = {
+    'META_COMMUN': (
+        ('ID', 'id'),
+        ('ANCIEN_ID', 'ancien_id'),
+        ('ORIGINE', 'origine'),
+        ('URL', 'url'),
+        ('NATURE', 'nature'),
+    ),
+    'META_JURI': (
+        ('TITRE', 'titre'),
+        ('DATE_DEC', 'date_decision'),
+        ('JURIDICTION', 'juridiction'),
+        ('NUMERO', 'numero'),
+        ('SOLUTION', 'solution'),
+    ),
+    'META_JURI_JUDI': (
+        ('.//NUMERO_AFFAIRE/text()', 'numero_affaire'),
+        ('FORMATION', 'formation'),
+        ('SIEGE_APPEL', 'siege_appel'),
+        ('JURI_PREM', 'juridiction_premiere_instance'),
+        ('LIEU_PREM', 'lieu_premiere_instance'),
+        ('PRESIDENT', 'president'),
+        ('AVOCAT_GL', 'avocat_general'),
+        ('AVOCATS', 'avocats'),
+        ('RAPPORTEUR', 'rapporteur'),
+    ),
+    'CONTENU': 'contenu',
+    'SOMMAIRE': 'sommaire',
+    # Only the (often long) LIENS list follows TEXTE
+    'TEXTE': None,
+}
+
+
+INCA_SCHEMA = {
+    'META_COMMUN': (
+        ('ID', 'id'),
+        ('ANCIEN_ID', 'ancien_id'),
+        ('ORIGINE', 'origine'),
+        ('URL', 'url'),
+        ('NATURE', 'nature'),
+    ),
+    'META_JURI': (
+        ('TITRE', 'titre'),
+        ('DATE_DEC', 'date_decision'),
+        ('JURIDICTION', 'juridiction'),
+        ('NUMERO', 'numero'),
+        ('SOLUTION', 'solution'),
+    ),
+    'META_JURI_JUDI': (
+        ('.//NUMERO_AFFAIRE/text()', 'numero_affaire'),
+        ('PUBLI_BULL/@publie', 'publie_bulletin'),
+        ('FORMATION', 'formation'),
+        ('DATE_DEC_ATT', 'date_decision_attaquee'),
+        ('FORM_DEC_ATT', 'juridiction_attaquee'),
+        ('SIEGE_APPEL', 'siege_appel'),
+        ('JURI_PREM', 'juridiction_premiere_instance'),
+        ('LIEU_PREM', 'lieu_premiere_instance'),
+        ('DEMANDEUR', 'demandeur'),
+        ('DEFENDEUR', 'defendeur'),
+        ('PRESIDENT', 'president'),
+        ('AVOCAT_GL', 'avocat_general'),
+        ('AVOCATS', 'avocats'),
+        ('RAPPORTEUR', 'rapporteur'),
+        ('ECLI', 'ecli'),
+    ),
+    'CONTENU': 'contenu',
+    'SOMMAIRE': 'sommaire',
+}
+
+# Same documents as INCA, with the summary split into its sections
+CASS_SCHEMA = INCA_SCHEMA | {
+    'SOMMAIRE': (
+        (".//SCT[@TYPE='PRINCIPAL']", 'sommaire_principal'),
+        (".//SCT[@TYPE='REFERENCE']", 'sommaire_reference'),
+        ('.//ANA', 'sommaire_analyse'),
+    ),
+    'TEXTE': None,
+}
+
+JADE_SCHEMA = {
+    'META_COMMUN': (
+        ('ID', 'id'),
+        ('ANCIEN_ID', 'ancien_id'),
+        ('ORIGINE', 'origine'),
+        ('URL', 'url'),
+        ('NATURE', 'nature'),
+    ),
+    'META_JURI': (
+        ('TITRE', 'titre'),
+        ('DATE_DEC', 'date_decision'),
+        ('JURIDICTION', 'juridiction'),
+        ('NUMERO', 'numero'),
+    ),
+    'META_JURI_ADMIN': (
+        ('FORMATION', 'formation'),
+        ('TYPE_REC', 'type_recours'),
+        ('PUBLI_RECUEIL', 'publication_recueil'),
+        ('PRESIDENT', 'president'),
+        ('AVOCATS', 'avocats'),
+        ('RAPPORTEUR', 'rapporteur'),
+        ('COMMISSAIRE_GVT', 'commissaire_gouvernement'),
+    ),
+    'CONTENU': 'contenu',
+}
+
+# Output is JSONL, gzip-compressed when the file name ends in .gz; set
+# SHARD_BY_YEAR=1 to split it into one file per decision year instead of a
+# single dataset file
+SHARD_BY_YEAR = bool(os.environ.get('SHARD_BY_YEAR'))
+
+# Progress is logged every _LOG_EVERY written records; tqdm covers the rest
+_LOG_EVERY = 50_000
+
+# At most this many archives sit extracted on disk at once, counting those
+# being downloaded/extracted, waiting to be parsed and being parsed
+_MAX_EXTRACTED = 12
+
+# Files whose first _SNIFF_SIZE bytes lack this tag are not parsed
+_SNIFF_TAG = b'<META_COMMUN'
+_SNIFF_SIZE = 4096
+
+# Low-cardinality fields whose values repeat across documents: interned so
+# every record shares one string object per distinct value
+_INTERNED_FIELDS = frozenset((
+    'origine', 'nature', 'juridiction', 'solution', 'formation',
+    'publie_bulletin', 'type_recours', 'publication_recueil',
+))
+
+def schema_defaults(schema):
+    """Every field of a schema's records, in output order, mapped to ''"""
+    fields = []
+    for spec in schema.values():
+        if spec is None:
+            continue
+        fields.extend((spec,) if isinstance(spec, str) else (field for _, field in spec))
+    return dict.fromkeys(fields, '')
+
+def download(session, url, filename, download_dir):
+    """Download a tar.gz file into download_dir, reusing the copy from a
+    previous run if there is one. Returns its path, or None on failure."""
+    tar_path = download_dir / filename
+    if tar_path.exists():
+        logging.info(f"Using cached {filename}")
+        return tar_path
+
+    with session.get(url, stream=True, timeout=(10, 60)) as response:
+        if response.status_code != 200:
+            logging.error(f"Failed to download {filename}. Status code: {response.status_code}")
+            return None
+
+        # Written under a temporary name and renamed once complete, so an
+        # interrupted download is never mistaken for a cached archive
+        part_path = download_dir / (filename + '.part')
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    os.replace(part_path, tar_path)
+    return tar_path
+
+def download_and_extract(session, url, filename, download_dir, extract_dir):
+    """Download (or reuse) a tar.gz file and extract it into its own temporary
+    directory under extract_dir. Returns the TemporaryDirectory, or None on failure."""
+    try:
+        tar_path = download(session, url, filename, download_dir)
+        if tar_path is None:
+            return None
+
+        archive_dir = tempfile.TemporaryDirectory(dir=extract_dir, prefix=filename.removesuffix('.tar.gz') + '_')
+        try:
+            with tarfile.open(tar_path, 'r|gz') as tar:
+                tar.extractall(path=archive_dir.name)
+        except Exception:
+            # Drop the cached copy as well so the next run downloads it again
+            archive_dir.cleanup()
+            tar_path.unlink(missing_ok=True)
+            raise
+
+        logging.info(f"Successfully downloaded and extracted {filename}")
+        return archive_dir
+    except Exception as e:
+        logging.error(f"Error processing {filename}: {str(e)}")
+        return None
+
+def clean_body(text):
+    """Normalize whitespace in text extracted by the XML parser (tags and entities already resolved)"""
+    if not text:
+        return ""
+    # str.split/join splits on the same characters as \s+ and also drops
+    # the ends, without going through the regex engine
+    return ' '.join(text.split())
+
+@lru_cache(maxsize=None)
+def _compile_fields(pairs):
+    """Split a metadata container's (path, field) pairs into a child tag -> field
+    lookup and compiled XPaths for the nested paths (once per worker process)"""
+    children = {path: field for path, field in pairs if '/' not in path}
+    xpaths = tuple((ET.XPath(path, smart_strings=False), field) for path, field in pairs if '/' in path)
+    return children, xpaths
+
+def _set_field(data, field, text):
+    """Store a cleaned value unless the field already has one (first occurrence wins)"""
+    if text and not data.get(field):
+        value = clean_body(text)
+        data[field] = sys.intern(value) if field in _INTERNED_FIELDS else value
+
+def parse_xml(xml_path, schema):
+    """Parse XML file and return dictionary of the schema fields it contains"""
+    try:
+        with open(xml_path, 'rb') as f:
+            # DILA documents have META_COMMUN within their first few hundred
+            # bytes; HTML error pages and empty or truncated files are skipped
+            # without starting the parser
+            if _SNIFF_TAG not in f.read(_SNIFF_SIZE):
+                logging.warning(f"Skipping {xml_path}: not a DILA document")
+                return None
+            f.seek(0)
+
+            data = {}
+
+            # Only the container elements are visited; each one is read as soon as it
+            # closes and then freed so the document never sits whole in memory
+            for _, elem in ET.iterparse(f, events=('end',), tag=tuple(schema), huge_tree=True):
+                spec = schema[elem.tag]
+                if spec is None:
+                    break
+                if isinstance(spec, str):
+                    data[spec] = clean_body(ET.tostring(elem, method='text', encoding='unicode', with_tail=False))
+                else:
+                    # Metadata containers: one pass over their children, routed by tag
+                    children, xpaths = _compile_fields(spec)
+                    for child in elem:
+                        field = children.get(child.tag)
+                        if field is not None:
+                            _set_field(data, field, child.text)
+                    for xpath, field in xpaths:
+                        values = xpath(elem)
+                        if values:
+                            value = values[0]
+                            _set_field(data, field, value if isinstance(value, str) else value.text)
+
+                elem.clear(keep_tail=True)
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+            return data
+    except Exception as e:
+        logging.error(f"Error parsing {xml_path}: {str(e)}")
+        return None
+
+def parse_xml_files(xml_paths, schema):
+    """Parse a chunk of XML files (runs in a worker process)"""
+    return [parse_xml(xml_path, schema) for xml_path in xml_paths]
+
+def _release(archive_dir, slots):
+    """Delete an archive's extracted directory and give its slot back"""
+    archive_dir.cleanup()
+    slots.release()
+
+def _collect(entry, slots):
+    """Yield the results of one in-flight chunk, then release its archive
+    if this was the archive's last chunk"""
+    future, done_dir = entry
+    try:
+        yield from future.result()
+    finally:
+        if done_dir is not None:
+            _release(done_dir, slots)
+
+def parse_archives(executor, archive_queue, schema, slots, chunksize=64):
+    """Yield parse_xml results in input order, parsing chunks across the pool.
+
+    archive_queue holds (archive_dir, xml_paths) pairs, archive_dir being the
+    archive's TemporaryDirectory, up to a closing None. It is consumed as it
+    goes with only a bounded number of chunks in flight. Results come back in
+    order, so once an archive's last chunk is collected all of its files have
+    been parsed: its extracted directory is deleted and its slot handed back.
+    """
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    in_flight = deque()
+    archive_dir = None
+    try:
+        while True:
+            try:
+                item = archive_queue.get_nowait()
+            except queue.Empty:
+                # Nothing ready: the producer may be waiting for a slot held by
+                # an archive whose chunks are in flight (many small archives
+                # fit under max_in_flight), so collect them before blocking
+                while in_flight:
+                    yield from _collect(in_flight.popleft(), slots)
+                item = archive_queue.get()
+            if item is None:
+                break
+            archive_dir, xml_paths = item
+            if not xml_paths:
+                _release(archive_dir, slots)
+                continue
+            for start in range(0, len(xml_paths), chunksize):
+                last = start + chunksize >= len(xml_paths)
+                in_flight.append((executor.submit(parse_xml_files, xml_paths[start:start + chunksize], schema),
+                                  archive_dir if last else None))
+                if len(in_flight) >= max_in_flight:
+                    yield from _collect(in_flight.popleft(), slots)
+        while in_flight:
+            yield from _collect(in_flight.popleft(), slots)
+    finally:
+        # Closed early (the consumer failed): don't leave chunks queued on the
+        # pool or archives extracted on disk. The run is over, so slots no
+        # longer matter
+        for future, done_dir in in_flight:
+            future.cancel()
+            if done_dir is not None:
+                done_dir.cleanup()
+        if archive_dir is not None:
+            archive_dir.cleanup()
+
+def iter_xml(path):
+    """Yield the paths of all .xml files under path, recursing with os.scandir"""
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_xml(entry.path)
+            elif entry.name.endswith('.xml'):
+                yield entry.path
+
+def queue_archives(session, filenames, base_url, download_dir, extract_dir, archive_queue, slots, stop):
+    """Download and extract archives, queueing each one's XML files in list order.
+
+    Every archive is extracted into its own temporary directory under
+    extract_dir and queued as (archive_dir, xml_paths). Later archives carry
+    updated versions of documents from earlier ones, so archives are queued
+    in list order even when a later download finishes first.
+
+    A download only starts once it has taken one of slots, which the parser
+    hands back as each archive is deleted, so however far parsing falls
+    behind no more archives than that are ever extracted at once. Gives up
+    once stop is set (the consumer has failed); otherwise None is queued
+    once all archives have been handled.
+    """
+    try:
+        # Downloads are network-bound, so a few run side by side over the
+        # pooled session
+        with ThreadPoolExecutor(max_workers=8) as executor, \
+                tqdm(total=len(filenames), desc="Downloading files") as progress:
+            pending = deque(filenames)
+            futures = deque()
+            try:
+                while (pending or futures) and not stop.is_set():
+                    if pending and slots.acquire(blocking=False):
+                        filename = pending.popleft()
+                        futures.append(executor.submit(download_and_extract, session, base_url + filename,
+                                                       filename, download_dir, extract_dir))
+                    elif futures:
+                        # No slot is free (or everything has started): hand the
+                        # oldest archive to the parser, which is what frees slots
+                        archive_dir = futures.popleft().result()
+                        progress.update()
+                        if archive_dir is None:
+                            slots.release()
+                        else:
+                            archive_queue.put((archive_dir, list(iter_xml(archive_dir.name))))
+                    elif slots.acquire(timeout=1):
+                        # Every started archive is with the parser; wait for one
+                        # to be done with, checking stop now and then
+                        slots.release()
+            finally:
+                # Downloads that haven't started are dropped rather than waited for
+                for future in futures:
+                    future.cancel()
+    except Exception as e:
+        logging.error(f"Error queueing XML files: {str(e)}")
+    finally:
+        archive_queue.put(None)
+
+def _open_jsonl(path, mode):
+    """Open a JSONL file in binary mode, through gzip if its name ends in .gz"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=3)
+    # 1 MiB buffer: records go to disk in large chunks, not one write each
+    return open(path, mode, buffering=1 << 20)
+
+def open_output(stack, outputs, output_file, data):
+    """Return the file data should be written to, opening it on first use.
+
+    Without SHARD_BY_YEAR everything goes to output_file; otherwise each
+    decision year gets its own <output_file stem>_<year>.jsonl[.gz] next to it.
+    """
+    key = None
+    if SHARD_BY_YEAR:
+        # The year ends up in a file name, so anything but digits (missing or
+        # malformed dates such as 19/05/2019) goes to the 'unknown' shard
+        key = data.get('date_decision', '')[:4]
+        if not key.isdigit():
+            key = 'unknown'
+    out_f = outputs.get(key)
+    if out_f is None:
+        path = output_file.with_name(output_file.name.replace('.jsonl', f'_{key}.jsonl')) if SHARD_BY_YEAR else output_file
+        out_f = outputs[key] = stack.enter_context(_open_jsonl(path, 'wb'))
+    return out_f
+
+def _drop_lines(path, superseded):
+    """Rewrite a JSONL output file without the given (0-based) lines"""
+    # Keeps the extension so the copy is compressed the same way
+    root, ext = os.path.splitext(path)
+    tmp_path = f'{root}.tmp{ext}'
+    with _open_jsonl(path, 'rb') as src, _open_jsonl(tmp_path, 'wb') as dst:
+        dst.writelines(line for i, line in enumerate(src) if i not in superseded)
+    os.replace(tmp_path, path)
+
+def write_records(records, output_file, defaults):
+    """Write parse results to output_file (see open_output). Returns the paths
+    written and the number of records they hold.
+
+    records come in archive list order, and a document updated by a later
+    archive turns up once per version. As when the archives were extracted
+    over one another, the last version read wins: earlier copies are dropped
+    from the files once everything has been written.
+    """
+    outputs = {}
+    lines = {}   # output -> lines written to it
+    latest = {}  # document id -> (output, line) of its last copy
+    stale = {}   # output -> lines holding a superseded copy
+    total = 0
+    with ExitStack() as stack:
+        for data in records:
+            if data is None:
+                continue
+            out_f = open_output(stack, outputs, output_file, data)
+            out_f.write(orjson.dumps(defaults | data, option=orjson.OPT_APPEND_NEWLINE))
+            line = lines.get(out_f, 0)
+            lines[out_f] = line + 1
+            doc_id = data.get('id')
+            if doc_id:
+                previous = latest.get(doc_id)
+                if previous is not None:
+                    stale.setdefault(previous[0], set()).add(previous[1])
+                latest[doc_id] = (out_f, line)
+            total += 1
+
+            if total % _LOG_EVERY == 0:
+                logging.info("Processed %d documents", total)
+
+    for out_f, superseded in stale.items():
+        _drop_lines(out_f.name, superseded)
+        total -= len(superseded)
+        logging.info("Dropped %d superseded records from '%s'", len(superseded), out_f.name)
+    return [out_f.name for out_f in outputs.values()], total
+
+def run(base_url, csv_path, schema, output_file, download_dir, extract_dir):
+    """Download every archive listed in csv_path from base_url, parse its XML
+    files with schema and write the records to output_file (see open_output).
+    Returns the paths written, or None if nothing was.
+
+    Archives are kept in download_dir so later runs only fetch new ones;
+    their extracted files are removed as soon as they have been parsed.
+    A document found in several archives is written once, from the last
+    archive listed.
+    """
+    os.makedirs(output_file.parent, exist_ok=True)
+    os.makedirs(download_dir, exist_ok=True)
+    os.makedirs(extract_dir, exist_ok=True)
+
+    defaults = schema_defaults(schema)
+
+    # Read the CSV file
+    try:
+        # Archive names may be split across rows and/or columns
+        with open(csv_path, 'r', newline='') as f:
+            filenames = [fname.strip() for row in csv.reader(f) for fname in row if fname.strip()]
+        # Drop duplicates (keeping order) so no archive is downloaded twice
+        filenames = list(dict.fromkeys(filenames))
+        logging.info(f"Found {len(filenames)} files to process in {csv_path}")
+    except Exception as e:
+        logging.error(f"Error reading {csv_path}: {str(e)}")
+        return None
+
+    # One pooled session so every tarball reuses the connection to the DILA host
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                          max_retries=Retry(total=3, backoff_factor=0.5,
+                                            status_forcelist=[429, 500, 502, 503, 504]))
+    session.mount('https://', adapter)
+
+    # Download/extract, parse and write run as a pipeline: a producer thread
+    # queues the XML files of each archive once it is extracted, the process
+    # pool parses them and this thread writes the results. The queue itself
+    # is unbounded: slots caps how many archives are extracted, which bounds
+    # both disk use and the queue
+    archive_queue = queue.Queue()
+    slots = threading.BoundedSemaphore(_MAX_EXTRACTED)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=queue_archives,
+        args=(session, filenames, base_url, download_dir, extract_dir, archive_queue, slots, stop)
+    )
+    producer.start()
+
+    logging.info("Processing XML files...")
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+                closing(parse_archives(executor, archive_queue, schema, slots)) as results:
+            paths, total_processed = write_records(tqdm(results, desc="Processing XML files"),
+                                                   output_file, defaults)
+    finally:
+        # If parsing or writing failed, the producer must not be left waiting
+        # for a slot: stop it, then delete what it had already queued
+        stop.set()
+        producer.join()
+        while not archive_queue.empty():
+            item = archive_queue.get_nowait()
+            if item is not None:
+                item[0].cleanup()
+
+    if total_processed == 0:
+        logging.error("No XML documents were processed!")
+        return None
+
+    logging.info(f"Process completed. Total documents processed: {total_processed}")
+    for path in paths:
+        logging.info(f"Dataset saved as '{path}'")
+    return paths